@@ -1,9 +1,14 @@
+import csv
+import io
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from uuid import uuid4
 
 import pandas as pd
 import streamlit as st
+from PIL import Image, ImageOps
 
 
 # ========================
@@ -11,11 +16,15 @@ import streamlit as st
 # ========================
 APP_TITLE = "🐰 うさぎグルーミング管理"
 
-DATA_DIR = "data"
+# パスは app.py の場所を基準にする（起動時のカレントディレクトリに依存しない）
+# __file__ の解決は import 時に1回だけ
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DATA_DIR = os.path.join(BASE_DIR, "data")
 PHOTO_DIR = os.path.join(DATA_DIR, "photos")
 
 # ★プロフィール画像置き場（GitHubに入れる）
-PROFILE_DIR = os.path.join("assets", "profiles")
+PROFILE_DIR = os.path.join(BASE_DIR, "assets", "profiles")
 
 MASTER_FILE = os.path.join(DATA_DIR, "rabbit_data.csv")  # うさぎマスタ
 LOG_FILE_TEMPLATE = os.path.join(DATA_DIR, "grooming_{rabbit_id}.csv")  # 履歴ログ
@@ -34,6 +43,32 @@ COL_W = "体重(g)"
 COL_MEMO = "メモ"
 COL_PHOTOS = "写真ファイル"  # 1行に複数写真を "a.jpg|b.png" のように保存
 
+# 日時の保存形式（CSVもUIもこの形式で統一）
+DT_FORMAT = "%Y-%m-%d %H:%M"
+
+# アップロード写真は保存時に縮小・再エンコードする（長辺px / 画質）
+PHOTO_MAX_PX = 1600
+PHOTO_QUALITY = 85
+PHOTO_COPY_BUF = 1 << 20  # そのまま保存するときのコピー単位（1MiB）
+
+# 履歴カード用の縮小画像（元写真の横に "<元ファイル名>.thumb.jpg" で置く）
+THUMB_PX = 420
+THUMB_SUFFIX = ".thumb.jpg"
+
+# 体重グラフに渡す点数の上限（超えたら日ごとの平均に間引く）
+CHART_MAX_POINTS = 500
+
+# read_csv に型を明示して、列ごとの型推定を省く
+# （体重は手編集された値でも落ちないよう、load_log 側で数値化する）
+MASTER_DTYPES = {"RabbitID": str, "名前": str, "次回予約日時": str}
+LOG_DTYPES = {COL_DT: str, COL_MEMO: str, COL_PHOTOS: str}
+
+# load_log が付ける内部列（表示のときは外す）
+LOG_INTERNAL_COLS = ["_dt", "_dt_str"]
+
+# CSVを1行ずつ流して書き直すときの入出力バッファ（既定の8KiBだと細かい write が大量に出る）
+CSV_STREAM_BUF = 1 << 20
+
 
 # ========================
 # Utility
@@ -46,18 +81,31 @@ def ensure_dirs():
 
 
 def to_dt_str(dt: datetime) -> str:
-    return dt.strftime("%Y-%m-%d %H:%M")
+    # DT_FORMAT は ISO 8601（区切りが空白）と同じ形なので、C実装の isoformat で組み立てる
+    return dt.isoformat(sep=" ", timespec="minutes")
 
 
 def parse_dt_str(s: str):
-    if not isinstance(s, str) or not s.strip():
+    """
+    'YYYY-MM-DD HH:MM' 固定長だけを受け付けて fromisoformat で読む（strptime より速い）
+    """
+    if not isinstance(s, str):
+        return None
+    s = s.strip()
+    if len(s) != 16 or s[4] != "-" or s[7] != "-" or s[10] != " " or s[13] != ":":
         return None
     try:
-        return datetime.strptime(s.strip(), "%Y-%m-%d %H:%M")
+        return datetime.fromisoformat(s)
     except Exception:
         return None
 
 
+@st.cache_data(ttl=60, show_spinner=False)
+def _now_min() -> datetime:
+    """フォーム初期値用の現在時刻（分単位）。rerun ごとに作り直さない"""
+    return datetime.now().replace(second=0, microsecond=0)
+
+
 def split_photos(cell) -> list[str]:
     """CSVの '写真ファイル' セル → ['a.jpg','b.png'] に変換（空やnanに強い）"""
     if cell is None:
@@ -79,6 +127,93 @@ def photo_path(filename: str) -> str:
     return os.path.join(PHOTO_DIR, filename)
 
 
+def thumb_path(filename: str) -> str:
+    return photo_path(f"{filename}{THUMB_SUFFIX}")
+
+
+def get_thumb(filename: str) -> str:
+    """
+    履歴カード用の縮小画像（横 THUMB_PX）のパスを返す。無ければ初回だけ作る
+    作れない画像（壊れている等）は元ファイルのパスを返す
+    """
+    tp = thumb_path(filename)
+    if os.path.basename(tp) in _list_photos():
+        return tp
+
+    try:
+        with Image.open(photo_path(filename)) as img:
+            thumb = ImageOps.exif_transpose(img)
+            thumb.thumbnail((THUMB_PX, THUMB_PX * 4))
+            thumb.convert("RGB").save(tp, "JPEG", quality=PHOTO_QUALITY)
+    except Exception:
+        return photo_path(filename)
+
+    _list_files.clear()
+    return tp
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def thumb_image(filename: str):
+    """
+    st.image に渡す縮小画像。写真ファイル名は一意でサムネイルの中身は変わらないので、
+    バイト列をキャッシュして rerun のたびにディスクから読まない（作れなければ元のパス）
+    """
+    tp = get_thumb(filename)
+    if tp != thumb_path(filename):
+        return tp
+    with open(tp, "rb") as f:
+        return f.read()
+
+
+def file_sig(path: str) -> tuple[int, int]:
+    """
+    キャッシュのキー用：(更新時刻ns, サイズ)
+    mtime の分解能が粗いFSでも、追記・削除でサイズが変われば別キーになる
+    """
+    info = os.stat(path)
+    return (info.st_mtime_ns, info.st_size)
+
+
+def file_sig_or_init(path: str, init) -> tuple[int, int]:
+    """file_sig の作成つき版：無ければ init() で作ってから取り直す"""
+    # ほぼ常に存在するので、先に exists を見ずに stat して、無い時だけ作る
+    try:
+        return file_sig(path)
+    except FileNotFoundError:
+        init()
+        return file_sig(path)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _list_files(dir_path: str, dir_mtime_ns: int) -> frozenset[str]:
+    """
+    dir_path 直下のファイル名を1回の scandir でまとめて取得（無ければ空）
+    フォルダの mtime は中のファイルが増減すると変わるので、それをキャッシュのキーにする
+    """
+    try:
+        with os.scandir(dir_path) as it:
+            return frozenset(e.name for e in it if e.is_file())
+    except FileNotFoundError:
+        return frozenset()
+
+
+def _dir_files(dir_path: str) -> frozenset[str]:
+    try:
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+    except FileNotFoundError:
+        return frozenset()
+    return _list_files(dir_path, mtime_ns)
+
+
+def _list_photos() -> frozenset[str]:
+    """存在チェックを1枚ずつ stat せず、この集合への in で済ませる"""
+    return _dir_files(PHOTO_DIR)
+
+
+def _list_profiles() -> frozenset[str]:
+    return _dir_files(PROFILE_DIR)
+
+
 def safe_delete_file(path: str) -> bool:
     try:
         if os.path.exists(path):
@@ -86,6 +221,8 @@ def safe_delete_file(path: str) -> bool:
         return True
     except Exception:
         return False
+    finally:
+        _list_files.clear()
 
 
 # ========================
@@ -96,15 +233,11 @@ def profile_path(rabbit_id: str) -> str | None:
     assets/profiles/ に置いたプロフィール画像を探して返す。
     推奨ファイル名： R01.jpg / R02.png など（RabbitIDと同じ）
     """
-    candidates = [
-        os.path.join(PROFILE_DIR, f"{rabbit_id}.jpg"),
-        os.path.join(PROFILE_DIR, f"{rabbit_id}.jpeg"),
-        os.path.join(PROFILE_DIR, f"{rabbit_id}.png"),
-        os.path.join(PROFILE_DIR, f"{rabbit_id}.webp"),
-    ]
-    for p in candidates:
-        if os.path.exists(p):
-            return p
+    names = _list_profiles()
+    for ext in [".jpg", ".jpeg", ".png", ".webp"]:
+        name = f"{rabbit_id}{ext}"
+        if name in names:
+            return os.path.join(PROFILE_DIR, name)
     return None
 
 
@@ -149,10 +282,11 @@ def render_zoom_dialog_if_needed():
 # Master (Rabbit)
 # ========================
 def init_master():
-    ensure_dirs()
     if os.path.exists(MASTER_FILE):
         return
 
+    ensure_dirs()
+
     df = pd.DataFrame(
         {
             "RabbitID": [r[0] for r in RABBITS],
@@ -160,24 +294,46 @@ def init_master():
             "次回予約日時": ["" for _ in RABBITS],  # 次回1件だけ
         }
     )
-    df.to_csv(MASTER_FILE, index=False, encoding="utf-8-sig")
+    df.to_csv(MASTER_FILE, index=False, encoding="utf-8-sig", lineterminator="\n")
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _read_master_csv(path: str, sig: tuple[int, int]) -> pd.DataFrame:
+    """file_sig をキーにキャッシュ（ファイルが変わらない限り再パースしない）"""
+    return pd.read_csv(path, dtype=MASTER_DTYPES, encoding="utf-8-sig")
+
+
+def _master_sig() -> tuple[int, int]:
+    return file_sig_or_init(MASTER_FILE, init_master)
 
 
 def load_master() -> pd.DataFrame:
-    init_master()
-    return pd.read_csv(MASTER_FILE, encoding="utf-8-sig")
+    return _read_master_csv(MASTER_FILE, _master_sig())
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _master_labels(sig: tuple[int, int]) -> list[str]:
+    df = _read_master_csv(MASTER_FILE, sig)
+    return (df["RabbitID"].astype(str) + "：" + df["名前"].astype(str)).tolist()
+
+
+def master_labels() -> list[str]:
+    """サイドバー用 'R01：名前' のリスト（マスタが変わらない限り作り直さない）"""
+    return _master_labels(_master_sig())
 
 
 def save_master(df: pd.DataFrame):
-    ensure_dirs()
-    df.to_csv(MASTER_FILE, index=False, encoding="utf-8-sig")
+    df.to_csv(MASTER_FILE, index=False, encoding="utf-8-sig", lineterminator="\n")
+    # mtime の分解能が粗いFSでも古いキャッシュを返さないように明示的に破棄
+    _read_master_csv.clear()
+    _master_labels.clear()
+    st.session_state.pop("_id2idx", None)
 
 
 # ========================
 # Logs (Grooming)
 # ========================
 def log_file_path(rabbit_id: str) -> str:
-    ensure_dirs()
     return LOG_FILE_TEMPLATE.format(rabbit_id=rabbit_id)
 
 
@@ -185,34 +341,100 @@ def init_log(rabbit_id: str):
     path = log_file_path(rabbit_id)
     if os.path.exists(path):
         return
+    ensure_dirs()
     df = pd.DataFrame(columns=[COL_DT, COL_W, COL_MEMO, COL_PHOTOS])
-    df.to_csv(path, index=False, encoding="utf-8-sig")
+    # BOMはExcelで開いたときの文字化け対策で先頭に1回だけ。改行は追記側と同じ \n に揃える
+    df.to_csv(path, index=False, encoding="utf-8-sig", lineterminator="\n")
 
 
-def load_log(rabbit_id: str) -> pd.DataFrame:
-    path = log_file_path(rabbit_id)
-    if not os.path.exists(path):
-        init_log(rabbit_id)
+@st.cache_resource(show_spinner=False)
+def _log_store() -> dict[str, tuple[tuple[int, int], pd.DataFrame]]:
+    """
+    読み込んだログ {path: (file_sig, DataFrame)}。st.cache_resource なのでプロセス全体で共有し、
+    cache_data と違って取り出すたびのコピー（pickle）も発生しない。
+    ログはユーザーごとではなくアプリ全体のデータなので、セッション間で共有して問題ない
+    """
+    return {}
+
+
+def _invalidate_log(path: str):
+    # 共有中の DataFrame は書き換えず、エントリごと捨てて次の load_log で読み直す
+    _log_store().pop(path, None)
 
-    df = pd.read_csv(path, encoding="utf-8-sig")
+
+def _parse_log_csv(path: str) -> pd.DataFrame:
+    """列の補完と _dt の変換まで済ませた状態にする（キャッシュヒット時は変換も不要）"""
+    # engine="pyarrow" は使わない：日時列を文字列指定でも秒付きに変換し、空セルが
+    # "None" 文字列になる。数千行程度のログでは C エンジンの方が速い
+    # memory_map：ページキャッシュから直接パースする。追記はファイル末尾への書き足し、
+    # 写真削除は別ファイルを os.replace で差し替えるので、読み込み中の範囲は書き換わらない
+    df = pd.read_csv(path, dtype=LOG_DTYPES, encoding="utf-8-sig", memory_map=True)
 
     # 旧CSVとの互換（列が無い場合に追加）
     for c in [COL_DT, COL_W, COL_MEMO, COL_PHOTOS]:
         if c not in df.columns:
             df[c] = ""
 
-    # 並び替え用のdt列
-    df["_dt"] = pd.to_datetime(df[COL_DT], errors="coerce")
+    # 並び替え用のdt列（形式を明示して要素ごとの形式推定を避ける）
+    dt = pd.to_datetime(df[COL_DT], format=DT_FORMAT, errors="coerce")
+    # 秒付き・スラッシュ区切りなど旧形式/手編集の行だけ、形式推定で読み直す
+    legacy = dt.isna() & df[COL_DT].notna()
+    # 表示用の日時文字列。通常の行は保存値がそのまま DT_FORMAT なので、旧形式の行だけ整形する
+    df["_dt_str"] = df[COL_DT]
+    if legacy.any():
+        dt[legacy] = pd.to_datetime(df.loc[legacy, COL_DT], format="mixed", errors="coerce")
+        df.loc[legacy, "_dt_str"] = dt[legacy].dt.strftime(DT_FORMAT)
+    df["_dt"] = dt
     df = df.dropna(subset=["_dt"])
+
+    # 体重はここで1回だけ数値化（空や手編集の不正値は NaN）
+    # アプリが書いたCSVなら read_csv の時点で float になっているので何もしない
+    if not pd.api.types.is_numeric_dtype(df[COL_W]):
+        df[COL_W] = pd.to_numeric(df[COL_W], errors="coerce")
+    return df
+
+
+def load_log(rabbit_id: str) -> pd.DataFrame:
+    path = log_file_path(rabbit_id)
+    sig = file_sig_or_init(path, lambda: init_log(rabbit_id))
+
+    # 返す DataFrame は他のセッションとも共有しているので、呼び出し側で書き換えないこと
+    hit = _log_store().get(path)
+    if hit is not None and hit[0] == sig:
+        return hit[1]
+
+    df = _parse_log_csv(path)
+    _log_store()[path] = (sig, df)
     return df
 
 
-def save_log(rabbit_id: str, df: pd.DataFrame):
-    """内部列 _dt を除いて保存"""
-    out = df.copy()
-    if "_dt" in out.columns:
-        out = out.drop(columns=["_dt"])
-    out.to_csv(log_file_path(rabbit_id), index=False, encoding="utf-8-sig")
+def _save_photo_file(src, base_name: str, ext: str) -> str:
+    """
+    写真を長辺 PHOTO_MAX_PX まで縮小して保存し、保存したファイル名を返す
+    src はアップロードされたファイル（読み込み可能なバイナリストリーム）。
+    EXIF の向きは画素に反映してから捨てる。Pillow で読めない画像はそのまま保存
+    """
+    try:
+        src.seek(0)
+        img = Image.open(src)
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((PHOTO_MAX_PX, PHOTO_MAX_PX))
+    except Exception:
+        filename = f"{base_name}{ext}"
+        src.seek(0)
+        with open(photo_path(filename), "wb") as f:
+            shutil.copyfileobj(src, f, PHOTO_COPY_BUF)
+        return filename
+
+    if ext == ".webp":
+        filename = f"{base_name}.webp"
+        img.save(photo_path(filename), "WEBP", quality=PHOTO_QUALITY)
+    else:
+        filename = f"{base_name}.jpg"
+        img.convert("RGB").save(
+            photo_path(filename), "JPEG", quality=PHOTO_QUALITY, progressive=True, optimize=True
+        )
+    return filename
 
 
 def save_uploaded_photos(rabbit_id: str, dt: datetime, uploaded_files) -> list[str]:
@@ -223,9 +445,7 @@ def save_uploaded_photos(rabbit_id: str, dt: datetime, uploaded_files) -> list[s
     if not uploaded_files:
         return []
 
-    ensure_dirs()
-
-    saved = []
+    tasks = []
     base_dt = dt.strftime("%Y%m%d_%H%M")
     for uf in uploaded_files:
         if uf is None:
@@ -235,14 +455,18 @@ def save_uploaded_photos(rabbit_id: str, dt: datetime, uploaded_files) -> list[s
             ext = ".jpg"
 
         unique = uuid4().hex[:8]
-        filename = f"{rabbit_id}_{base_dt}_{unique}{ext}"
-        path = photo_path(filename)
+        base_name = f"{rabbit_id}_{base_dt}_{unique}"
+        tasks.append((uf, base_name, ext))
 
-        with open(path, "wb") as f:
-            f.write(uf.getbuffer())
+    if not tasks:
+        return []
 
-        saved.append(filename)
+    # 縮小・エンコードは Pillow が GIL を外すので、複数枚はスレッドで並べて処理
+    # （map は入力順を保つので、返すファイル名の順番も選択順のまま）
+    with ThreadPoolExecutor(max_workers=min(4, len(tasks))) as ex:
+        saved = list(ex.map(lambda t: _save_photo_file(*t), tasks))
 
+    _list_files.clear()
     return saved
 
 
@@ -253,44 +477,104 @@ def append_log_row(
     memo: str,
     photo_files: list[str],
 ):
-    df = load_log(rabbit_id)
+    """
+    1行だけ追記する（全件読み込み→連結→全件書き直し をしない）
+    ヘッダは init_log が書くので、ここでは BOM なしで末尾に足すだけ
+    """
+    init_log(rabbit_id)
+
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerow(
+        [
+            to_dt_str(dt),
+            ("" if weight_g is None else float(weight_g)),
+            memo,
+            join_photos(photo_files),
+        ]
+    )
 
-    new_row = {
-        COL_DT: to_dt_str(dt),
-        COL_W: ("" if weight_g is None else float(weight_g)),
-        COL_MEMO: memo,
-        COL_PHOTOS: join_photos(photo_files),
-        "_dt": pd.to_datetime(to_dt_str(dt), errors="coerce"),
-    }
+    with open(log_file_path(rabbit_id), "ab+") as f:
+        # 手編集などで末尾に改行が無いと前の行とくっつくので、その時だけ補う
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) not in (b"\n", b"\r"):
+                f.write(b"\n")
+        f.write(buf.getvalue().encode("utf-8"))
 
-    df2 = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    save_log(rabbit_id, df2)
+    _invalidate_log(log_file_path(rabbit_id))
 
 
 def delete_one_photo_from_row(rabbit_id: str, row_index: int, filename: str):
     """
     指定の行の写真リストから filename を1つ外す + ファイルも削除
+    row_index はCSV上の行番号（load_log の index と同じ）。
+    DataFrame を経由せず、CSVを1行ずつ流して該当セルだけ書き換える
     """
-    df = load_log(rabbit_id).reset_index(drop=True)
-
-    if row_index < 0 or row_index >= len(df):
+    path = log_file_path(rabbit_id)
+    if row_index < 0 or not os.path.exists(path):
         return
 
-    photos = split_photos(df.loc[row_index, COL_PHOTOS])
-    photos = [p for p in photos if p != filename]
-    df.loc[row_index, COL_PHOTOS] = join_photos(photos)
+    tmp = path + ".tmp"
+    found = False
+    with open(path, newline="", encoding="utf-8-sig", buffering=CSV_STREAM_BUF) as src, open(
+        tmp, "w", newline="", encoding="utf-8-sig", buffering=CSV_STREAM_BUF
+    ) as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst, lineterminator="\n")
+
+        header = next(reader, [])
+        writer.writerow(header)
+        col = header.index(COL_PHOTOS) if COL_PHOTOS in header else -1
+
+        i = 0
+        for row in reader:
+            # 空行は read_csv が読み飛ばすので、行番号に数えずそのまま流す
+            if not row:
+                writer.writerow(row)
+                continue
+            if i == row_index and 0 <= col < len(row):
+                photos = split_photos(row[col])
+                if filename in photos:
+                    row[col] = join_photos([p for p in photos if p != filename])
+                    found = True
+            writer.writerow(row)
+            i += 1
+
+    # 該当の行に filename が無ければ、CSVも写真ファイルも触らない
+    if not found:
+        safe_delete_file(tmp)
+        return
 
-    # 保存（CSV反映）
-    save_log(rabbit_id, df)
+    # 保存（CSV反映）：書き終えてから置き換えるので途中で落ちても元ファイルは壊れない
+    os.replace(tmp, path)
+    _invalidate_log(path)
 
     # ファイル削除（存在すれば）
     safe_delete_file(photo_path(filename))
+    safe_delete_file(thumb_path(filename))
+    thumb_image.clear()
+
+
+# ========================
+# Bootstrap
+# ========================
+@st.cache_resource(show_spinner=False)
+def _bootstrap() -> bool:
+    """
+    フォルダ・マスタ・各うさぎのログを用意（プロセスにつき1回だけ実行される）
+    途中でファイルが消えても、load_log / append_log_row 側で作り直す
+    """
+    ensure_dirs()
+    init_master()
+    for rabbit_id, _ in RABBITS:
+        init_log(rabbit_id)
+    return True
 
 
 # ========================
 # UI
 # ========================
-ICON_PATH = os.path.join("assets", "icons", "icon.png")
+ICON_PATH = os.path.join(BASE_DIR, "assets", "icons", "icon.png")
 
 st.set_page_config(
     page_title=APP_TITLE,
@@ -300,13 +584,15 @@ st.set_page_config(
 st.title(APP_TITLE)
 st.caption("✅ データは data/ に保存されます（Streamlit Cloud でも動作）")
 
-init_master()
+# 毎回の rerun で makedirs / 存在チェックを繰り返さない
+_bootstrap()
+
 master_df = load_master()
 
 # --- うさぎ選択（ここで sel_id が確定する） ---
-rabbit_labels = [f"{row.RabbitID}：{row.名前}" for row in master_df.itertuples()]
+rabbit_labels = master_labels()
 sel_label = st.sidebar.selectbox("うさぎを選択", rabbit_labels)
-sel_id = sel_label.split("：")[0]
+sel_id = sel_label.partition("：")[0]
 
 # --- サイドバー：プロフィール画像（sel_id の後に置くのが正解） ---
 st.sidebar.markdown("### 🐰 プロフィール")
@@ -317,9 +603,25 @@ else:
     st.sidebar.info("プロフィール画像が未設定です（assets/profiles に R01.jpg などを置く）")
 
 # 選択行（次回予約）
-row_idx = master_df.index[master_df["RabbitID"] == sel_id][0]
-next_str = str(master_df.loc[row_idx, "次回予約日時"]) if "次回予約日時" in master_df.columns else ""
-next_dt = parse_dt_str(next_str)
+# RabbitID → 行index の辞書を session_state に持つ。外でCSVが並び替えられても
+# 引いた行の RabbitID を確かめて、ずれていたら作り直す
+id2idx = st.session_state.get("_id2idx") or {}
+row_idx = id2idx.get(sel_id)
+if row_idx not in master_df.index or master_df.at[row_idx, "RabbitID"] != sel_id:
+    id2idx = dict(zip(master_df["RabbitID"], master_df.index))
+    st.session_state["_id2idx"] = id2idx
+    row_idx = id2idx[sel_id]
+next_raw = master_df.at[row_idx, "次回予約日時"] if "次回予約日時" in master_df.columns else ""
+next_str = next_raw if isinstance(next_raw, str) else ""  # 空セルは NaN で来る
+
+# 同じ文字列なら前回のパース結果を使い回す（うさぎごとに session_state に保持）
+next_key = f"_next_dt_{sel_id}"
+cached_next = st.session_state.get(next_key)
+if cached_next and cached_next[0] == next_str:
+    next_dt = cached_next[1]
+else:
+    next_dt = parse_dt_str(next_str)
+    st.session_state[next_key] = (next_str, next_dt)
 
 tab1, tab2, tab3 = st.tabs(["📅 次回予約（1件）", "🧼 当日完了登録", "📈 体重グラフ・履歴（写真削除）"])
 
@@ -327,7 +629,10 @@ tab1, tab2, tab3 = st.tabs(["📅 次回予約（1件）", "🧼 当日完了登
 # ------------------------
 # Tab1: Next booking
 # ------------------------
-with tab1:
+# 各タブは fragment にして、タブ内の入力操作ではそのタブだけ再実行する
+# （保存後の st.rerun() はアプリ全体を再実行する）
+@st.fragment
+def render_tab1(master_df: pd.DataFrame, row_idx: int, next_dt: datetime | None):
     st.subheader("次回グルーミング予約（うさぎごとに“次回1件だけ”）")
 
     if next_dt:
@@ -336,7 +641,7 @@ with tab1:
         st.warning("次回予約が未設定です")
 
     st.markdown("### 次回予約を設定 / 更新")
-    base = next_dt if next_dt else datetime.now().replace(second=0, microsecond=0)
+    base = next_dt if next_dt else _now_min()
 
     d = st.date_input("日付", value=base.date(), key="next_date")
     t = st.time_input("時刻", value=base.time(), key="next_time")
@@ -358,14 +663,19 @@ with tab1:
             st.rerun()
 
 
+with tab1:
+    render_tab1(master_df, row_idx, next_dt)
+
+
 # ------------------------
 # Tab2: Done log + Photo upload (multiple)
 # ------------------------
-with tab2:
+@st.fragment
+def render_tab2(master_df: pd.DataFrame, row_idx: int, sel_id: str, next_str: str):
     st.subheader("当日のグルーミング完了を登録")
     st.caption("完了を記録すると、次回予約は“消化した”扱いで空になります。")
 
-    done_base = datetime.now().replace(second=0, microsecond=0)
+    done_base = _now_min()
     done_date = st.date_input("実施日", value=done_base.date(), key="done_date")
     done_time = st.time_input("実施時刻", value=done_base.time(), key="done_time")
 
@@ -387,54 +697,71 @@ with tab2:
 
     if st.button("🧼 完了を記録する"):
         done_dt = datetime.combine(done_date, done_time)
-        init_log(sel_id)
 
         w = None if weight_g == 0.0 else float(weight_g)
         saved_files = save_uploaded_photos(sel_id, done_dt, photos)
 
         append_log_row(sel_id, done_dt, w, memo.strip(), saved_files)
 
-        # 次回予約を消化してクリア
-        master_df.loc[row_idx, "次回予約日時"] = ""
-        save_master(master_df)
+        # 次回予約を消化してクリア（予約が入っていたときだけマスタを書き直す）
+        if next_str.strip():
+            master_df.loc[row_idx, "次回予約日時"] = ""
+            save_master(master_df)
 
         st.success("記録しました（次回予約はクリアされました）")
         st.rerun()
 
 
+with tab2:
+    render_tab2(master_df, row_idx, sel_id, next_str)
+
+
 # ------------------------
 # Tab3: History + chart + delete photo + zoom
 # ------------------------
-with tab3:
+@st.fragment
+def render_tab3(sel_id: str):
     st.subheader("体重グラフ・履歴（写真の削除もここ）")
 
-    init_log(sel_id)
     log_df = load_log(sel_id)
 
     if log_df.empty:
         st.info("まだ履歴がありません。『当日完了登録』で記録してください。")
     else:
         # 表示用（新しい順）
-        view_df = log_df.copy()
-        view_df = view_df.sort_values("_dt", ascending=False).reset_index(drop=True)
+        # 1回だけ昇順に並べて、履歴（新しい順）とグラフ（古い順）の両方に使う
+        # 記録は追記なので普段は既に昇順。過去日で登録された時だけ並べ替える
+        # index はCSV上の行番号のまま残す（写真削除で元の行を指すため）
+        if log_df["_dt"].is_monotonic_increasing:
+            asc_df = log_df
+        else:
+            asc_df = log_df.sort_values("_dt", kind="stable")
+        view_df = asc_df.iloc[::-1]
 
         st.markdown("### 履歴（新しい順）")
         with st.expander("履歴データ（CSV）", expanded=False):
-            show_df = view_df.drop(columns=["_dt"], errors="ignore")
+            show_df = view_df.drop(columns=LOG_INTERNAL_COLS, errors="ignore")
             st.dataframe(show_df, width="stretch")
 
         st.markdown("### 履歴カード（写真は1枚ずつ削除できます）")
 
-        for i, row in view_df.iterrows():
-            dt_str = str(row.get(COL_DT, ""))
-            w_str = str(row.get(COL_W, ""))
-            memo_str = str(row.get(COL_MEMO, ""))
+        # 写真セルの分割は列ごとにまとめて行う（1行ずつ split_photos を呼ばない）
+        photo_lists = view_df[COL_PHOTOS].fillna("").str.split("|")
+        photos_on_disk = _list_photos()
 
-            st.write(f"🕒 **{dt_str}**　　⚖️ **{w_str} g**")
+        for i, dt_str, w_val, memo_val, photos_raw in zip(
+            view_df.index, view_df["_dt_str"], view_df[COL_W], view_df[COL_MEMO], photo_lists
+        ):
+            w_str = str(w_val)
+            memo_str = str(memo_val)
+
+            # 見出しとメモは1つの要素にまとめて送る（カードごとの要素数を減らす）
+            card_md = f"🕒 **{dt_str}**　　⚖️ **{w_str} g**"
             if memo_str and str(memo_str).lower() != "nan":
-                st.write(memo_str)
+                card_md += f"\n\n{memo_str}"
+            st.markdown(card_md)
 
-            photos_list = split_photos(row.get(COL_PHOTOS, ""))
+            photos_list = [p.strip() for p in photos_raw if p.strip()]
 
             if photos_list:
                 for p in photos_list:
@@ -443,13 +770,13 @@ with tab3:
                     # 画像 + ボタン群
                     cols = st.columns([3, 1])
                     with cols[0]:
-                        if os.path.exists(p_path):
-                            st.image(p_path, width=420)
+                        if p in photos_on_disk:
+                            st.image(thumb_image(p), width=THUMB_PX)
                         else:
                             st.caption(f"（写真が見つかりません：{p}）")
 
                     with cols[1]:
-                        if os.path.exists(p_path):
+                        if p in photos_on_disk:
                             if st.button("🔎 拡大", key=f"zoom_{sel_id}_{i}_{p}"):
                                 open_zoom(f"📸 写真を拡大（{sel_id} / {dt_str}）", p_path)
 
@@ -461,29 +788,42 @@ with tab3:
             st.divider()
 
         # ---- 体重グラフ（体重があるものだけ）----
-        wdf = log_df.copy()
-        wdf[COL_W] = pd.to_numeric(wdf[COL_W], errors="coerce")
-        wdf = wdf.dropna(subset=["_dt", COL_W]).sort_values("_dt")
+        wdf = asc_df[asc_df[COL_W].notna()]
 
         st.markdown("### 体重推移")
         if wdf.empty:
             st.info("体重が入力された記録がないため、グラフは表示されません。")
         else:
-            min_d = wdf["_dt"].min().date()
-            max_d = wdf["_dt"].max().date()
+            # 昇順なので先頭・末尾がそのまま最小・最大
+            min_d = wdf["_dt"].iloc[0].date()
+            max_d = wdf["_dt"].iloc[-1].date()
 
-            start_d, end_d = st.date_input(
+            picked = st.date_input(
                 "表示期間",
                 value=(min_d, max_d),
                 key="weight_range",
             )
-
-            wview = wdf[(wdf["_dt"].dt.date >= start_d) & (wdf["_dt"].dt.date <= end_d)]
+            # 開始日だけ選んだ途中の状態では要素が1つ（消すと0）なので、その場合も落ちないように
+            start_d = picked[0] if picked else min_d
+            end_d = picked[-1] if picked else max_d
+
+            # 昇順の日時列（datetime64）を二分探索して [開始日 0:00, 終了日の翌日 0:00) を切り出す
+            # （.dt.date で行ごとに date オブジェクトを作らない）
+            lo, hi = wdf["_dt"].searchsorted(
+                [pd.Timestamp(start_d), pd.Timestamp(end_d) + pd.Timedelta(days=1)]
+            )
+            wview = wdf.iloc[lo:hi]
             if wview.empty:
                 st.warning("この期間には体重データがありません。期間を広げてください。")
             else:
-                st.line_chart(wview.set_index("_dt")[COL_W])
+                chart_w = wview.set_index("_dt")[COL_W]
+                if len(chart_w) > CHART_MAX_POINTS:
+                    chart_w = chart_w.resample("D").mean().dropna()
+                st.line_chart(chart_w)
                 st.caption("※単位：g（グラム）")
 
+with tab3:
+    render_tab3(sel_id)
+
 # ---- 画面の最後で、必要なら拡大ダイアログを出す ----
 render_zoom_dialog_if_needed()